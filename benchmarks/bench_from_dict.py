@@ -0,0 +1,89 @@
+"""
+Compare rebuilding a HamFile from to_dict JSON and NDJSON, against parsing the
+Ham text it came from. Exits with status 1 if a rebuilt file doesn't fill in
+to the same text, or have the same fingerprints, as the original.
+
+    python benchmarks/bench_from_dict.py [SCENES] [LINES]
+"""
+
+import io
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ham_file
+from generate import generate_ham
+
+
+def main():
+    scenes = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    lines = int(sys.argv[2]) if len(sys.argv) > 2 else 40
+
+    text = generate_ham(scenes, lines)
+    ham = ham_file.from_file(io.StringIO(text), "bench")
+
+    json_text = json.dumps(ham.to_dict())
+    ndjson = io.StringIO()
+    ham_file.to_ndjson(ham, ndjson)
+    ndjson_text = ndjson.getvalue()
+
+    failed = False
+    for name, rebuilt in [
+        ("json", ham_file.from_json(io.StringIO(json_text), "bench")),
+        ("ndjson", ham_file.from_ndjson(io.StringIO(ndjson_text), "bench")),
+    ]:
+        mismatches = check_round_trip(ham, rebuilt)
+        if mismatches:
+            print(f"{name}: {mismatches} lines differ from the original")
+            failed = True
+
+    def run(name: str, fn):
+        number = 5
+        seconds = min(timeit.repeat(fn, number=number, repeat=3)) / number
+        print(f"{name:<12} {seconds * 1000:9.2f} ms")
+
+    print(f"{scenes} scenes, {len(text.splitlines())} lines")
+    run("text", lambda: ham_file.from_file(io.StringIO(text), "bench"))
+    run("json", lambda: ham_file.from_json(io.StringIO(json_text), "bench"))
+    run("ndjson", lambda: ham_file.from_ndjson(io.StringIO(ndjson_text), "bench"))
+
+    if failed:
+        sys.exit(1)
+
+
+def check_round_trip(ham, rebuilt) -> int:
+    """
+    Count the lines whose filled text or fingerprint changed when rebuilt.
+    """
+
+    def content(h):
+        for scene in h.scenes:
+            lines = scene.content_lines()
+            if lines:
+                yield scene, lines
+
+    old_scenes = list(content(ham))
+    new_scenes = list(content(rebuilt))
+    if len(old_scenes) != len(new_scenes):
+        return max(len(old_scenes), len(new_scenes))
+
+    mismatches = 0
+    for (old_scene, old_lines), (new_scene, new_lines) in zip(old_scenes, new_scenes):
+        if len(old_lines) != len(new_lines):
+            mismatches += max(len(old_lines), len(new_lines))
+            continue
+
+        for old, new in zip(old_lines, new_lines):
+            if ham.fill_line(old, old_scene) != rebuilt.fill_line(
+                new, new_scene
+            ) or old.fingerprint(ham, old_scene) != new.fingerprint(rebuilt, new_scene):
+                mismatches += 1
+
+    return mismatches
+
+
+if __name__ == "__main__":
+    main()
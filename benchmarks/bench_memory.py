@@ -0,0 +1,73 @@
+"""
+Measure how much memory a parsed HamFile takes per line, with tracemalloc, and
+fail if it has grown past a threshold.
+
+    python benchmarks/bench_memory.py [--scenes N] [--lines N] [--max-bytes-per-line N]
+
+Exits with status 1 on a regression, so it can run in CI.
+"""
+
+import argparse
+import gc
+import io
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ham_file
+from generate import generate_ham
+
+# About 340 bytes per line at the time of writing, with some headroom
+MAX_BYTES_PER_LINE = 450
+
+
+def measure(text: str, **kwargs) -> "tuple[float, dict]":
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        ham = ham_file.from_file(io.StringIO(text), "bench", **kwargs)
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    report = ham.memory_report()
+    return (after - before), report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scenes", type=int, default=100)
+    parser.add_argument("--lines", type=int, default=40)
+    parser.add_argument("--max-bytes-per-line", type=float, default=MAX_BYTES_PER_LINE)
+    args = parser.parse_args()
+
+    text = generate_ham(args.scenes, args.lines)
+    traced, report = measure(text)
+    bytes_per_line = traced / report["lines"]
+
+    print(f"{report['lines']} lines, {traced} bytes traced")
+    print(f"{bytes_per_line:.1f} bytes per line (limit {args.max_bytes_per_line})")
+    print()
+    print(f"{'kind':<12} {'lines':>7} {'objects':>10} {'strings':>10}")
+    for kind, sizes in sorted(report["kinds"].items()):
+        print(
+            f"{kind:<12} {sizes['lines']:>7} {sizes['objects']:>10} "
+            f"{sizes['strings']:>10}"
+        )
+    for key in ["caches", "containers", "total"]:
+        print(f"{key:<12} {report[key]:>29}")
+
+    lazy_traced, _ = measure(text, lazy=True)
+    print()
+    print(f"lazy, unparsed: {lazy_traced / report['lines']:.1f} bytes per line")
+
+    if bytes_per_line > args.max_bytes_per_line:
+        print("Memory regression: bytes per line is over the limit")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Hammer a frozen HamFile from a thread pool, while another thread edits the
+original, and check every read matches a single-threaded export.
+
+    python benchmarks/bench_threads.py [--threads N] [--rounds N]
+
+Exits with status 1 if any thread sees a different result.
+"""
+
+import argparse
+import io
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import ham_file
+from generate import generate_ham
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    ham = ham_file.from_file(io.StringIO(generate_ham(40, 40)), "bench")
+    expected = ham.to_dict()
+    frozen = ham.freeze()
+
+    # Edit the original the whole time, which mustn't show up in the snapshot
+    stop = threading.Event()
+
+    def edit():
+        i = 0
+        while not stop.is_set():
+            ham.set_variable("FOOD", f"figs {i}")
+            ham.scenes[1].lines[3].text(f"edited {i}")
+            i += 1
+
+    def read_scene(index: int) -> bool:
+        scene = frozen.scenes[index]
+        scene_dict = scene.to_dict(frozen, include_comments=False)
+        if not scene_dict["lines"]:
+            return True
+        return scene_dict in expected["scenes"]
+
+    def read_all(_) -> bool:
+        return frozen.to_dict() == expected
+
+    editor = threading.Thread(target=edit)
+    editor.start()
+
+    start = time.perf_counter()
+    failures = 0
+    try:
+        with ThreadPoolExecutor(args.threads) as pool:
+            for _ in range(args.rounds):
+                scenes = range(len(frozen.scenes))
+                failures += sum(not ok for ok in pool.map(read_scene, scenes))
+                failures += sum(not ok for ok in pool.map(read_all, range(4)))
+    finally:
+        stop.set()
+        editor.join()
+
+    seconds = time.perf_counter() - start
+    print(f"{args.threads} threads, {args.rounds} rounds in {seconds:.2f}s")
+
+    if failures:
+        print(f"{failures} reads didn't match")
+        sys.exit(1)
+    print("All reads matched")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import random
+
+
+def generate_ham(scenes: int = 50, lines: int = 40, seed: int = 1) -> str:
+    """
+    Generate a Ham script, with constants, timing, instructions and speech.
+    """
+    rng = random.Random(seed)
+    speakers = ["Bob", "Alice", "Big Tom"]
+
+    out = [
+        "# Generated script",
+        "FOOD = grapes",
+        "MEAL = $FOOD and cheese",
+        "VOICE_BOB = robert",
+        "",
+    ]
+
+    for s in range(scenes):
+        out.append(f"== Scene {s} ==")
+        out.append(f"_LOC = room {s}")
+        out.append(f"S{s} = $FOOD number {s}")
+
+        for l in range(lines):
+            k = rng.random()
+            if k < 0.1:
+                out.append(f"%t {l}.5:1.25,0.5")
+            elif k < 0.2:
+                out.append("!CAMERA pan $_LOC # slowly")
+            elif k < 0.25:
+                out.append("# A comment")
+            elif k < 0.3 and out[-1][0] not in "%!#":
+                out.append("+ and $MEAL")
+            else:
+                action = rng.choice(["", "[sad] "])
+                out.append(
+                    f"{rng.choice(speakers)}: {action}I like $MEAL in $_LOC, "
+                    f"and $S{s} for \\$5"
+                )
+
+    return "\n".join(out) + "\n"
@@ -1,4 +1,4 @@
-from ._ham_file import HamFile, from_file
+from ._ham_file import HamFile, from_file, diff_lines, LineChange
 
 from ._scene import HamFileScene
 from ._scene import (
@@ -9,3 +9,10 @@ from ._scene import (
     VariableLine,
     TextLine,
 )
+
+from ._cache import HamFileCache
+from ._columns import LineColumns
+from ._graph import ConstantGraph, Impact
+from ._frozen import FrozenHamFile, FrozenScene
+from ._json import from_dict, from_json, from_ndjson, to_ndjson
+from ._stream import HamAppender, HamTail
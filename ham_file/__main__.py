@@ -1,14 +1,13 @@
-import sys
+import argparse
 
-from __init__ import *
-from exceptions import *
 from ham_file import *
 from ham_file.exceptions import *
+from ham_file._server import serve
 
 
-def _unit_test():
+def _unit_test(file_name: str):
     try:
-        file = from_file(sys.argv[1])
+        file = from_file(file_name)
 
         for scene in file.scenes:
             print(scene)
@@ -28,5 +27,34 @@ def _unit_test():
         exit(1)
 
 
+def _main():
+    parser = argparse.ArgumentParser(prog="ham_file")
+    parser.add_argument("file", nargs="?", help="Ham file to dump")
+    parser.add_argument(
+        "--serve",
+        metavar="SOCKET",
+        help="keep parsed files resident, and serve them over a Unix socket",
+    )
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        metavar="MB",
+        help="evict least recently used files past this size (default 256)",
+    )
+    args = parser.parse_args()
+
+    if args.serve:
+        max_bytes = args.max_memory * 1024 * 1024 if args.max_memory else None
+        try:
+            serve(args.serve, max_bytes)
+        except FileExistsError as e:
+            print(e)
+            exit(1)
+    elif args.file:
+        _unit_test(args.file)
+    else:
+        parser.error("a file or --serve is required")
+
+
 if __name__ == "__main__":
-    _unit_test()
+    _main()
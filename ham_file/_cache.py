@@ -0,0 +1,119 @@
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from ._ham_file import HamFile, from_file
+
+
+class HamFileCache:
+    """
+    Keeps parsed HamFiles resident, so loading the same file again is cheap.
+
+    Files named by path are keyed by their real path, and reloaded when their
+    size or modification time changes. The cached HamFile's file_name is that
+    real path, whichever path it was loaded by. Open files are read, and keyed
+    by their name and a hash of their contents, so different contents under
+    the same name are cached side by side.
+
+    Cached files are frozen (see HamFile.freeze), so callers can't change the
+    cached copy, and can read it from many threads at once. fork() one to
+    edit it. When there are more than max_entries files, or their estimated
+    size grows past max_bytes, the least recently used are evicted. Either
+    limit may be None. Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024, max_entries: int = None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._entries: "OrderedDict[object, tuple]" = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "bytes": self._total_bytes,
+        }
+
+    def load(self, file_or_name, name: str = "") -> HamFile:
+        """
+        Like from_file, but returns the cached, frozen copy if there is one.
+        """
+        if type(file_or_name) == str:
+            path = os.path.realpath(file_or_name)
+            stat = os.stat(path)
+            key = path
+            version = (stat.st_mtime_ns, stat.st_size)
+
+            def parse():
+                return from_file(path)
+
+        else:
+            if len(name) == 0:
+                raise ValueError("name is required when reading an existing file")
+
+            text = file_or_name.read()
+            digest = hashlib.blake2b(text.encode("utf-8")).digest()
+            key = ("content", name, digest)
+            version = None  # The key already changes with the contents
+
+            def parse():
+                return from_file(io.StringIO(text), name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        # Parse outside the lock, so slow files don't block other requests
+        ham = parse().freeze()
+        size = ham.memory_report()["total"]
+
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (version, ham, size)
+            self._total_bytes += size
+            self._evict()
+
+        return ham
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry:
+            self._total_bytes -= entry[2]
+
+    def _evict(self):
+        def is_full():
+            if self.max_entries is not None and len(self._entries) > self.max_entries:
+                return True
+            return self.max_bytes is not None and self._total_bytes > self.max_bytes
+
+        # Always keep the newest entry, even if it is larger than the limit
+        while is_full() and len(self._entries) > 1:
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            self.evictions += 1
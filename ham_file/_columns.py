@@ -0,0 +1,166 @@
+import csv
+from array import array
+
+
+class LineColumns:
+    """
+    Lines from one or more HamFiles, stored column by column in arrays instead
+    of one dict per line.
+
+    The same lines as to_dict are included. Text has its constants filled in,
+    and is stored back to back in one string, so each line only keeps its
+    start and end offsets. A text line's action is stored in the same string,
+    with its own offsets, rather than as to_dict's "[action] text" prefix.
+    Names are stored as indexes into self.names. Call extend() once per file
+    to concatenate files.
+    """
+
+    KINDS = ("text", "instruction", "comment")
+    FIELDS = (
+        "file",
+        "scene",
+        "kind",
+        "name",
+        "line_number",
+        "time",
+        "duration",
+        "padding",
+        "text_start",
+        "text_end",
+        "action_start",
+        "action_end",
+    )
+
+    def __init__(self):
+        self.file = array("i")
+        self.scene = array("i")
+        self.kind = array("b")  # Index into KINDS
+        self.name = array("i")  # Index into names
+        self.line_number = array("i")
+        self.time = array("d")
+        self.duration = array("d")
+        self.padding = array("d")
+        self.text_start = array("q")
+        self.text_end = array("q")
+        self.action_start = array("q")
+        self.action_end = array("q")
+
+        self.file_names: "list[str]" = []
+        self.names: "list[str]" = []
+        self._name_indexes: "dict[str, int]" = {}
+        self._text_parts: "list[str]" = []
+        self._text_length = 0
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    def extend(self, ham) -> "LineColumns":
+        file_index = len(self.file_names)
+        self.file_names.append(ham.file_name)
+        kinds = {kind: i for i, kind in enumerate(self.KINDS)}
+
+        for scene_index, scene in enumerate(ham.scenes):
+            for line in scene.content_lines():
+                text = ham.fill_line(line, scene)
+                action = ""
+                if line.kind == "text":
+                    action = ham.fill_variables(line.action(), scene)
+
+                self.file.append(file_index)
+                self.scene.append(scene_index)
+                self.kind.append(kinds[line.kind])
+                self.name.append(self._name_index(line.name()))
+                self.line_number.append(line.original_line_number)
+                self.time.append(line.time or 0.0)
+                self.duration.append(getattr(line, "duration", None) or 0.0)
+                self.padding.append(getattr(line, "padding", None) or 0.0)
+
+                self.text_start.append(self._text_length)
+                self._text_parts.append(text)
+                self._text_length += len(text)
+                self.text_end.append(self._text_length)
+
+                self.action_start.append(self._text_length)
+                self._text_parts.append(action)
+                self._text_length += len(action)
+                self.action_end.append(self._text_length)
+
+        return self
+
+    def text(self) -> str:
+        """
+        All line text and actions, back to back. Slice it with text_start and
+        text_end, or action_start and action_end.
+        """
+        if len(self._text_parts) > 1:
+            self._text_parts = ["".join(self._text_parts)]
+        return self._text_parts[0] if self._text_parts else ""
+
+    def line_text(self, index: int) -> str:
+        return self.text()[self.text_start[index] : self.text_end[index]]
+
+    def line_action(self, index: int) -> str:
+        return self.text()[self.action_start[index] : self.action_end[index]]
+
+    def to_numpy(self):
+        """
+        Return a NumPy structured array of the numeric columns. Requires numpy.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("numpy is required for LineColumns.to_numpy()")
+
+        types = {"b": np.int8, "i": np.int32, "q": np.int64, "d": np.float64}
+        columns = [(field, getattr(self, field)) for field in self.FIELDS]
+
+        table = np.empty(len(self), dtype=[(f, types[c.typecode]) for f, c in columns])
+        for field, column in columns:
+            table[field] = np.frombuffer(column, dtype=types[column.typecode])
+        return table
+
+    def write_csv(self, file):
+        """
+        Write one row per line, with kind, name, text and action written out in
+        full.
+        """
+        writer = csv.writer(file)
+        writer.writerow(
+            [
+                "file",
+                "scene",
+                "kind",
+                "name",
+                "line_number",
+                "time",
+                "duration",
+                "padding",
+                "text",
+                "action",
+            ]
+        )
+
+        text = self.text()
+        for i in range(len(self)):
+            writer.writerow(
+                [
+                    self.file_names[self.file[i]],
+                    self.scene[i],
+                    self.KINDS[self.kind[i]],
+                    self.names[self.name[i]],
+                    self.line_number[i],
+                    self.time[i],
+                    self.duration[i],
+                    self.padding[i],
+                    text[self.text_start[i] : self.text_end[i]],
+                    text[self.action_start[i] : self.action_end[i]],
+                ]
+            )
+
+    def _name_index(self, name: str) -> int:
+        index = self._name_indexes.get(name)
+        if index is None:
+            index = len(self.names)
+            self.names.append(name)
+            self._name_indexes[name] = index
+        return index
@@ -0,0 +1,127 @@
+"""
+Immutable HamFiles, for reading from many threads at once.
+
+HamFile itself makes no promises about threads: lines cache their templates,
+lazy scenes parse on first use, forked lines copy their attributes when first
+written, and nothing stops another thread editing a line mid-read. A FrozenHamFile, made
+by HamFile.freeze(), avoids all of that:
+
+- Scenes and their lines are copied, fully parsed, into tuples. Editing the
+  original HamFile afterwards doesn't affect the snapshot.
+- Every line has its template compiled, and its attributes set on the
+  instance, so reading never writes to a line.
+- Line setters, and writing to a line's or scene's attributes, raise
+  HamRuntimeError, as do set_variable and append_scene_line. fork() returns an ordinary, editable HamFile.
+- Constant lookups, and each line's text with constants filled in, are
+  worked out by freeze() and kept in dicts, so reads never add to them and
+  memory_report counts them.
+
+So any number of threads may call to_dict, fill_line, get_variable, etc. on a
+FrozenHamFile, or on its scenes, without locking.
+"""
+
+import copy
+
+from .exceptions import *
+from ._ham_file import HamFile
+from ._scene import *
+
+
+class FrozenScene(HamFileScene):
+    def __init__(self, scene: HamFileScene):
+        # Not calling HamFileScene.__init__, name and lines are read-only
+        object.__setattr__(self, "name", scene.name)
+        object.__setattr__(
+            self, "lines", tuple(_freeze_line(line) for line in scene.lines)
+        )
+
+    def __setattr__(self, name: str, value):
+        raise HamRuntimeError(
+            "Can't edit a frozen scene, fork() the HamFile first", -1, ""
+        )
+
+
+class FrozenHamFile(HamFile):
+    def __init__(self, ham: HamFile):
+        super().__init__(ham.file_name)
+        self.scenes = tuple(FrozenScene(scene) for scene in ham.scenes)
+
+        self._global_lines: "dict[str, VariableLine]" = {}
+        self._local_lines: "dict[tuple[int, str], VariableLine]" = {}
+        self._line_scenes: "dict[int, HamFileScene]" = {}
+        self._filled: "dict[tuple[int, int], str]" = {}
+
+        for scene in self.scenes:
+            for line in scene.lines:
+                self._line_scenes[id(line)] = scene
+                if line.kind != "variable":
+                    continue
+
+                self._global_lines.setdefault(line.name(), line)
+                self._local_lines.setdefault((id(scene), line.name()), line)
+
+        for scene in self.scenes:
+            for line in scene.lines:
+                self._filled[(id(line), id(scene))] = self.fill_line(line, scene)
+
+    def freeze(self) -> "FrozenHamFile":
+        return self
+
+    def _find_variable(
+        self, name: str, preferred_scene: HamFileScene = None
+    ) -> "tuple[VariableLine, HamFileScene]":
+        name = name.upper()
+
+        if name.startswith("_"):
+            if not preferred_scene:
+                return None, None
+            line = self._local_lines.get((id(preferred_scene), name))
+        else:
+            line = self._global_lines.get(name)
+
+        return line, self._line_scenes.get(id(line))
+
+    def get_scene(self, line: LineBase):
+        return self._line_scenes.get(id(line))
+
+    def find_line_scene(self, line: LineBase) -> HamFileScene:
+        return self._line_scenes.get(id(line))
+
+    def fill_line(self, line: LineBase, scene: HamFileScene = None) -> str:
+        # Lines filled in some other scene, or none, aren't kept
+        text = self._filled.get((id(line), id(scene)))
+        if text is None:
+            text = super().fill_line(line, scene)
+        return text
+
+    def _filled_values(self) -> "dict[tuple, str]":
+        # Constants are already filled in _filled, and reads mustn't add to
+        # shared state
+        return {}
+
+    def set_variable(self, name: str, value: str, scene=None):
+        raise self._frozen_error()
+
+    def append_scene_line(self, name: str) -> HamFileScene:
+        raise self._frozen_error()
+
+    def _read(self, file, lazy: bool = False):
+        raise self._frozen_error()
+
+    def _frozen_error(self) -> HamRuntimeError:
+        return HamRuntimeError(
+            "Can't edit a frozen HamFile, fork() it first", -1, self.file_name
+        )
+
+
+def _freeze_line(line: LineBase) -> LineBase:
+    line = copy.copy(line)
+
+    # Shadow class defaults, so reads never fall through to the class
+    for name in ["time", "original_line_number", "duration", "padding"]:
+        if hasattr(line, name):
+            setattr(line, name, getattr(line, name))
+
+    line.template()
+    object.__setattr__(line, "_frozen", True)
+    return line
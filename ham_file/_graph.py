@@ -0,0 +1,176 @@
+from collections import namedtuple
+
+from .exceptions import *
+from ._scene import *
+
+Impact = namedtuple("Impact", ["constants", "lines"])
+
+
+class ConstantGraph:
+    """
+    Which constants and lines refer to which constants, for one HamFile.
+
+    Built once, from each line's template. Constants are resolved once, in
+    dependency order, and impact() answers what has to be recomputed when a
+    constant changes. Rebuild the graph after editing the HamFile.
+    """
+
+    def __init__(self, ham):
+        self.ham = ham
+
+        # Keyed by id() of the VariableLine
+        self._dependents: "dict[int, list[LineBase]]" = {}
+        self._dependencies: "dict[int, list[VariableLine]]" = {}
+        self._scenes: "dict[int, HamFileScene]" = {}
+        self._positions: "dict[int, int]" = {}
+        self._lookups: "dict[tuple, VariableLine]" = {}
+        self._values: "dict[int, str]" = None
+
+        self.constants: "list[VariableLine]" = []
+        for scene in ham.scenes:
+            for line in scene.lines:
+                self._scenes[id(line)] = scene
+                self._positions[id(line)] = len(self._positions)
+                if line.kind == "variable":
+                    self.constants.append(line)
+                    self._dependents.setdefault(id(line), [])
+
+        for scene in ham.scenes:
+            for line in scene.lines:
+                dependencies = []
+                for name in line.variable_names():
+                    constant = self.find(name, scene)
+                    if constant:
+                        dependencies.append(constant)
+                        self._dependents[id(constant)].append(line)
+                self._dependencies[id(line)] = dependencies
+
+    def find(self, name: str, scene: HamFileScene = None) -> VariableLine:
+        """
+        Same as HamFile.find_variable_line, but only searches once per name.
+        """
+        name = name.upper()
+        key = (id(scene) if name.startswith("_") else None, name)
+        try:
+            return self._lookups[key]
+        except KeyError:
+            constant = self.ham.find_variable_line(name, scene)
+            self._lookups[key] = constant
+            return constant
+
+    def dependencies(self, line: LineBase) -> "list[VariableLine]":
+        """
+        The constants this line refers to directly.
+        """
+        return list(self._dependencies.get(id(line), []))
+
+    def dependents(self, constant: VariableLine) -> "list[LineBase]":
+        """
+        The lines, including constants, that refer to this constant directly.
+        """
+        return list(self._dependents.get(id(constant), []))
+
+    def order(self) -> "list[VariableLine]":
+        """
+        Constants, each after every constant it refers to.
+
+        Raises HamRuntimeError if constants refer to each other in a loop.
+        """
+        remaining = {id(c): len(self._dependencies[id(c)]) for c in self.constants}
+        ready = [c for c in self.constants if remaining[id(c)] == 0]
+        order = []
+
+        while ready:
+            constant = ready.pop()
+            order.append(constant)
+            for dependent in self._dependents[id(constant)]:
+                if dependent.kind != "variable":
+                    continue
+                remaining[id(dependent)] -= 1
+                if remaining[id(dependent)] == 0:
+                    ready.append(dependent)
+
+        if len(order) < len(self.constants):
+            stuck = [c for c in self.constants if remaining[id(c)] > 0]
+            names = ", ".join(c.name() for c in stuck)
+            raise HamRuntimeError(
+                f"Constants refer to each other: {names}",
+                stuck[0].original_line_number,
+                self.ham.file_name,
+            )
+
+        return order
+
+    def resolve(self) -> "dict[str, str]":
+        """
+        Resolve every constant once, and return the values of the global ones.
+        """
+        if self._values is None:
+            self._values = {}
+            for constant in self.order():
+                self._values[id(constant)] = self._fill(constant)
+
+        return {
+            c.name(): self._values[id(c)]
+            for c in self.constants
+            if not c.name().startswith("_")
+        }
+
+    def value(self, name: str, scene: HamFileScene = None) -> str:
+        constant = self.find(name, scene)
+        if not constant:
+            return None
+
+        self.resolve()
+        return self._values[id(constant)]
+
+    def fill_line(self, line: LineBase) -> str:
+        """
+        Same as HamFile.fill_line, but using the resolved constants.
+        """
+        self.resolve()
+        return self._fill(line)
+
+    def _fill(self, line: LineBase) -> str:
+        scene = self._scenes.get(id(line))
+        parts = list(line.template())
+
+        for i in range(1, len(parts), 2):
+            constant = self.find(parts[i], scene)
+            if constant:
+                parts[i] = self._values[id(constant)]
+
+        return "".join(parts)
+
+    def impact(self, name: str, scene: HamFileScene = None) -> Impact:
+        """
+        What changes if the constant is edited: every constant and line that
+        refers to it, directly or through other constants, in file order.
+
+        scene is only needed for _local constants.
+        """
+        constant = self.find(name, scene)
+        if not constant:
+            return Impact([], [])
+
+        constants = []
+        lines = []
+        seen = {id(constant)}
+        pending = [constant]
+
+        while pending:
+            for dependent in self._dependents[id(pending.pop())]:
+                if id(dependent) in seen:
+                    continue
+                seen.add(id(dependent))
+
+                if dependent.kind == "variable":
+                    constants.append(dependent)
+                    pending.append(dependent)
+                else:
+                    lines.append(dependent)
+
+        def position(line: LineBase) -> int:
+            return self._positions[id(line)]
+
+        return Impact(sorted(constants, key=position), sorted(lines, key=position))
@@ -1,6 +1,12 @@
+import difflib
+from collections import namedtuple
+
 import regex as re
 from .exceptions import *
 from ._scene import *
+from . import _scene
+from ._columns import LineColumns
+from ._memory import memory_report
 
 
 class HamFile:
@@ -13,11 +19,18 @@ class HamFile:
     re_assignment = re.compile(r"\s*([a-zA-Z_]\w*)\s*=\s*(.+)\s*$")
     re_line_action = re.compile(r"\s*\[([^\]]*)\]\s*")
     re_speaker_change = re.compile(r"^(.+?)\s*:\s*(.*?)\s*$")
-    re_variable = re.compile(r"(?<!\\)(?:\$([_a-z]\w*))", flags=re.IGNORECASE)
+    re_variable = re_variable
     re_comment = re.compile(r"^\s*#(.*)$")
     re_scene = re.compile(r"\s*==\s*(.+?)\s*==\s*$")
     re_continuation = re.compile(r"^\+\s*(.*)$")
 
+    # Scene that first defines each global constant, for lazily read files
+    _variable_scenes: "dict[str, HamFileScene]" = None
+
+    # Filled constants by (name, scene for _local ones), see fill_template
+    _values: "dict[tuple, str]" = None
+    _values_edits = -1
+
     def __init__(self, file_name=""):
         self.file_name = file_name
         self.scenes = [HamFileScene()]
@@ -30,6 +43,28 @@ class HamFile:
                 text.append(str(line))
         return "\n".join(text)
 
+    def fork(self) -> "HamFile":
+        """
+        Cheap copy of this HamFile, for tools that write out a marked-up copy of
+        their input.
+
+        The original is left untouched. Lines are shared between the two until
+        one is edited, so forking copies each scene's list of lines, but not
+        the lines themselves.
+        """
+        ham = HamFile(self.file_name)
+        ham.scenes = [scene.fork() for scene in self.scenes]
+        return ham
+
+    def freeze(self) -> "HamFile":
+        """
+        Immutable snapshot of this HamFile, which is safe to read from many
+        threads without locking. See _frozen.py.
+        """
+        from ._frozen import FrozenHamFile
+
+        return FrozenHamFile(self)
+
     def variables(self):
         for scene in self.scenes:
             yield from scene.variables()
@@ -46,16 +81,49 @@ class HamFile:
             if scene.name.casefold() == name.casefold():
                 return scene
 
-    def to_dict(self):
+    def to_dict(self, fingerprints: bool = False):
         obj = {}
 
         obj["scenes"] = []
         for scene in self.scenes:
-            scene_dict = scene.to_dict(self, include_comments=False)
+            scene_dict = scene.to_dict(
+                self, include_comments=False, fingerprints=fingerprints
+            )
             if len(scene_dict["lines"]) == 0:
                 continue
             obj["scenes"].append(scene_dict)
 
+        obj["variables"] = self.resolved_variables()
+
+        # obj["variables"] = [v.to_dict(self) for v in self.variables()]
+        return obj
+
+    def to_columns(self, columns: LineColumns = None) -> LineColumns:
+        """
+        Export lines column by column, without a dict per line. Pass columns
+        to append this file to an earlier export.
+        """
+        if columns is None:
+            columns = LineColumns()
+        return columns.extend(self)
+
+    def constant_graph(self):
+        """
+        Dependency graph of constants and the lines that use them. See
+        _graph.ConstantGraph.
+        """
+        from ._graph import ConstantGraph
+
+        return ConstantGraph(self)
+
+    def memory_report(self) -> dict:
+        """
+        Bytes used by lines of each kind, their strings, cached templates and
+        containers. See _memory.memory_report.
+        """
+        return memory_report(self)
+
+    def resolved_variables(self) -> "list[dict]":
         variables = []
         for scene in self.scenes:
             for variable in scene.variables():
@@ -65,17 +133,14 @@ class HamFile:
                 if is_local:
                     continue
 
-                value = self.fill_variables(variable.text(), scene, recurse=True)
+                value = self.fill_line(variable, scene)
 
                 var = {
                     "name": name,
                     "value": value,
                 }
                 variables.append(var)
-        obj["variables"] = variables
-
-        # obj["variables"] = [v.to_dict(self) for v in self.variables()]
-        return obj
+        return variables
 
     def append_scene_line(self, name: str) -> HamFileScene:
         scene = HamFileScene(name)
@@ -96,6 +161,9 @@ class HamFile:
             if not scene:
                 scene = self.scenes[0]
                 scene.lines.append(line)
+                if self._variable_scenes is not None:
+                    self._variable_scenes.setdefault(line.name(), scene)
+                _scene._edits += 1
             return
 
         line.value(value)
@@ -109,6 +177,14 @@ class HamFile:
     def find_variable_line(
         self, name: str, preferred_scene: HamFileScene = None
     ) -> VariableLine:
+        return self._find_variable(name, preferred_scene)[0]
+
+    def _find_variable(
+        self, name: str, preferred_scene: HamFileScene = None
+    ) -> "tuple[VariableLine, HamFileScene]":
+        """
+        The line defining a constant, and the scene it is in.
+        """
         name = name.upper()
 
         def find_in(scene: HamFileScene):
@@ -119,47 +195,82 @@ class HamFile:
                     return line
 
         if name.startswith("_"):
-            return find_in(preferred_scene) if preferred_scene else None
-
-        for scene in self.scenes:
+            scenes = [preferred_scene] if preferred_scene else []
+        elif self._variable_scenes is not None:
+            # Lazy files know which scene first defined each constant when the
+            # file was read, so only that scene is parsed. Scenes that are
+            # already parsed may have been edited since, so they're searched
+            # too, in file order.
+            indexed = self._variable_scenes.get(name)
+            scenes = (
+                scene
+                for scene in self.scenes
+                if scene is indexed or getattr(scene, "_raw_lines", None) is None
+            )
+        else:
+            scenes = self.scenes
+
+        for scene in scenes:
             found = find_in(scene)
             if found:
-                return found
+                return found, scene
 
-        return None
+        return None, None
 
     def fill_variables(
         self, text: str, local_scene: HamFileScene = None, recurse: bool = True
     ) -> str:
-        def sub(match: re.Match[str]) -> str:
-            name = match.group(1)
-            variable_line = self.find_variable_line(name, local_scene)
-            if not variable_line:
-                return name
-            variable_scene = self.get_scene(variable_line)
-            value = variable_line.text()
+        return self.fill_template(compile_template(str(text)), local_scene, recurse)
+
+    def fill_line(self, line: LineBase, scene: HamFileScene = None) -> str:
+        """
+        Line text, with constants filled in. Uses the line's cached template.
+        """
+        return self.fill_template(line.template(), scene, True)
+
+    def fill_template(
+        self,
+        template: "tuple[str, ...]",
+        local_scene: HamFileScene = None,
+        recurse: bool = True,
+    ) -> str:
+        """
+        Join a compiled template, with constants filled in. Filled constants
+        are cached until a line is edited, or set_variable is called. Constant
+        lines added to or removed from a scene by hand aren't noticed, unless a
+        line is edited afterwards.
+        """
+        if len(template) == 1:
+            return template[0]
+
+        values = self._filled_values()
+        parts = list(template)
+        for i in range(1, len(parts), 2):
+            name = parts[i]
+
             if recurse:
-                value = self.fill_variables(
-                    variable_line.text(), variable_scene, recurse=True
-                )
-            return value
+                key = (name.upper(), local_scene if name[0] == "_" else None)
+                value = values.get(key)
+                if value is not None:
+                    parts[i] = value
+                    continue
 
-        text = self.re_variable.sub(sub, str(text))
-        return text.replace("\\$", "$")
+            variable_line, variable_scene = self._find_variable(name, local_scene)
+            if not variable_line:
+                continue
 
-        # self.find_variable_line()
-        # if recurse:
-        #     old_text = None
-        #     while old_text != text:
-        #         old_text = text
-        #         text = self.fill_variables(text, local_scene=local_scene, recurse=False)
-        #     return text
+            if recurse:
+                parts[i] = values[key] = self.fill_line(variable_line, variable_scene)
+            else:
+                parts[i] = variable_line.text().replace("\\$", "$")
 
-        # def sub(match: re.Match[str]) -> str:
-        #     return self.get_variable(match.group(1), local_scene)
+        return "".join(parts)
 
-        # text = HamFile.re_variable.sub(sub, str(text))
-        # return text.replace("\\$", "$")
+    def _filled_values(self) -> "dict[tuple, str]":
+        if self._values_edits != _scene._edits:
+            self._values = {}
+            self._values_edits = _scene._edits
+        return self._values
 
     def parse_instruction_args(self, text: str) -> dict[str, str]:
         """
@@ -215,209 +326,462 @@ class HamFile:
         return args
 
     def _read_scenes(self, file) -> "list[HamFileScene]":
-        line_number = 0
+        reader = _SceneReader(
+            self, self.scenes[0], self.find_variable_line, self.scenes.append
+        )
+        del self.scenes[:]
 
-        current_scene = self.scenes[0]
+        for line in file:
+            reader.feed(line)
+        reader.finish()
+
+    def _read(self, file, lazy: bool = False):
+        if lazy:
+            self._read_scenes_lazy(file)
+        else:
+            self._read_scenes(file)
+
+    def _read_scenes_lazy(self, file):
+        """
+        Only find where each scene starts. Lines are parsed the first time a
+        scene's lines are used, so syntax errors are raised then, too. Timing
+        that can't be read is also raised by the scenes after it, since their
+        timing depends on it.
+        """
         del self.scenes[:]
+        variable_scenes: dict[str, _LazyScene] = {}
+
+        raw_lines = list(file)
+        speech = (None, None, None)
+        start = 0
+        start_speech = speech
+        name = None
+
+        def add_scene(end: int):
+            scene = _LazyScene(
+                self, name, len(self.scenes), raw_lines[start:end], start, start_speech
+            )
+            scene.variable_scenes = variable_scenes
+            self.scenes.append(scene)
+
+        for i, raw_line in enumerate(raw_lines):
+            line = raw_line.strip()
+            if not line or line[0] == "#":
+                continue
 
-        current_speaker = None
-        current_speech_time = None
-        current_speech_duration = None
-        current_speech_padding = None
+            if "=" in line:
+                match = HamFile.re_assignment.match(line)
+                if match:
+                    var_name = match.group(1).upper()
+                    variable_scenes.setdefault(var_name, len(self.scenes))
+                    continue
 
-        def add_line(raw_line: str, text: str):
-            if not current_speaker:
-                raise HamFileError("No speaker", line_number, self.file_name)
-            if not current_scene:
-                raise HamFileError("No scene", line_number, self.file_name)
+                match = HamFile.re_scene.match(line)
+                if match:
+                    add_scene(i)
+                    start = i
+                    start_speech = speech
+                    name = match.group(1).casefold()
+                    continue
 
-            text = text.strip()
+            # Bad timing is kept in place of the timing, and raised by the
+            # scenes that need it, once they're parsed
+            try:
+                if line[0] == "%":
+                    match = HamFile.re_processor.match(line)
+                    if match and match.group(1).casefold() == "t":
+                        speech = _read_speech_time(
+                            match.group(2), i + 1, self.file_name
+                        )
 
-            match = HamFile.re_line_action.match(text)
-            if match:
-                text = text[match.end() :]
-                action = match.group(1)
-            else:
-                action = ""
+                elif line[0] == "!":
+                    match = HamFile.re_instruction.match(line)
+                    if match and match.group(1).upper() == "SPEECHTIME":
+                        time = _read_instruction_speech_time(
+                            (match.group(2) or "").strip(), i + 1, self.file_name
+                        )
+                        if not isinstance(speech, Exception):
+                            speech = (time,) + speech[1:]
+            except Exception as e:
+                speech = e
 
-            line = TextLine(raw_line, current_speaker, text.strip())
-            line.time = current_speech_time
-            line.padding = current_speech_padding
-            line.duration = current_speech_duration
-            line.original_line_number = line_number
+        add_scene(len(raw_lines))
 
-            current_scene.lines.append(line)
+        # Map variable names to the scene that first defines them
+        for var_name, index in variable_scenes.items():
+            variable_scenes[var_name] = self.scenes[index]
+        self._variable_scenes = variable_scenes
 
-            if match:
-                line.action(action)
+    def find_line_scene(self, line: "LineBase") -> "HamFileScene":
+        for scene in self.scenes:
+            for scene_line in scene.lines:
+                if line is scene_line:
+                    return scene
 
-        for line in file:
-            raw_line = line
-            line = line.strip()
-            line_number += 1
-
-            # Strip Comments
-            match = HamFile.re_comment.match(line)
-            if match:
-                comment_line = CommentLine(raw_line, match.group(1))
-                comment_line.time = current_speech_time
-                comment_line.original_line_number = line_number
-                current_scene.lines.append(comment_line)
-                continue
 
-            if len(line) == 0:
-                blank_line = CommentLine("", None)
-                blank_line.original_line_number = line_number
-                current_scene.lines.append(blank_line)
-                continue
+class _SceneReader:
+    """
+    Parses a Ham file one line at a time, into scenes.
+
+    find_variable_line looks up constants defined before the current scene,
+    and on_scene is called with each scene once it has been read.
+    """
+
+    def __init__(
+        self,
+        ham: HamFile,
+        scene: HamFileScene,
+        find_variable_line,
+        on_scene,
+        line_number: int = 0,
+        speech: tuple = (None, None, None),
+    ):
+        self.ham = ham
+        self.scene = scene
+        self.find_variable_line = find_variable_line
+        self.on_scene = on_scene
+        self.line_number = line_number
+
+        self.speaker = None
+        self.speech_time, self.speech_duration, self.speech_padding = speech
+
+    def _error(self, msg: str) -> HamFileError:
+        return HamFileError(msg, self.line_number, self.ham.file_name)
+
+    def _add_line(self, raw_line: str, text: str):
+        if not self.speaker:
+            raise self._error("No speaker")
+        if not self.scene:
+            raise self._error("No scene")
+
+        text = text.strip()
+
+        match = HamFile.re_line_action.match(text)
+        if match:
+            text = text[match.end() :]
+            action = match.group(1)
+        else:
+            action = ""
+
+        line = TextLine(raw_line, self.speaker, text.strip())
+        line.time = self.speech_time
+        line.padding = self.speech_padding
+        line.duration = self.speech_duration
+        line.original_line_number = self.line_number
+
+        self.scene.lines.append(line)
+
+        if match:
+            line.action(action)
+
+    def feed(self, line: str):
+        raw_line = line
+        line = line.strip()
+        self.line_number += 1
+        line_number = self.line_number
+        current_scene = self.scene
+
+        # Strip Comments
+        match = HamFile.re_comment.match(line)
+        if match:
+            comment_line = CommentLine(raw_line, match.group(1))
+            comment_line.time = self.speech_time
+            comment_line.original_line_number = line_number
+            current_scene.lines.append(comment_line)
+            return
 
-            # Variable assignments
-            match = HamFile.re_assignment.match(line)
-            if match:
-                var_name = match.group(1).upper()
-                value = match.group(2)
-                variable_line = self.find_variable_line(var_name)
-                if variable_line:
-                    raise HamFileError(
-                        "Variable already exists", line_number, self.file_name
-                    )
-                variable_line = VariableLine(raw_line, var_name, value)
-                variable_line.original_line_number = line_number
-                current_scene.lines.append(variable_line)
-                continue
+        if len(line) == 0:
+            blank_line = CommentLine("", None)
+            blank_line.original_line_number = line_number
+            current_scene.lines.append(blank_line)
+            return
 
-            match = HamFile.re_scene.match(line)
-            if match:
-                current_speaker = None
+        # Variable assignments
+        match = HamFile.re_assignment.match(line)
+        if match:
+            var_name = match.group(1).upper()
+            value = match.group(2)
+            variable_line = self.find_variable_line(var_name)
+            if variable_line:
+                raise self._error("Variable already exists")
+            variable_line = VariableLine(raw_line, var_name, value)
+            variable_line.original_line_number = line_number
+            current_scene.lines.append(variable_line)
+            return
 
-                if current_scene:
-                    self.scenes.append(current_scene)
+        match = HamFile.re_scene.match(line)
+        if match:
+            self.speaker = None
 
-                name = match.group(1)
-                current_scene = HamFileScene(name.casefold())
+            if current_scene:
+                self.on_scene(current_scene)
 
-                processor_line = ProcessorLine(raw_line, "scene", name)
-                processor_line.original_line_number = line_number
-                current_scene.lines.append(processor_line)
-                continue
+            name = match.group(1)
+            self.scene = HamFileScene(name.casefold())
 
-            match = HamFile.re_processor.match(line)
-            if match:
-                name = match.group(1)
-                text = match.group(2)
-                processor_line = ProcessorLine(raw_line, name, text)
-                processor_line.original_line_number = line_number
-                current_scene.lines.append(processor_line)
-
-                name = name.casefold()
-                text = text.casefold()
-                if name == "t":
-
-                    def read_splits():
-                        splits = text.split(":")
-                        try:
-                            time = float(splits[0])
-                            return (time,) + tuple(
-                                float(t) for t in splits[1].split(",")
-                            )
-                        except ValueError:
-                            raise HamFileError(
-                                "Expected float for speech time, got '%s'" % text,
-                                line_number,
-                                self.file_name,
-                            )
-
-                    (
-                        current_speech_time,
-                        current_speech_duration,
-                        current_speech_padding,
-                    ) = read_splits()
-                continue
+            processor_line = ProcessorLine(raw_line, "scene", name)
+            processor_line.original_line_number = line_number
+            self.scene.lines.append(processor_line)
+            return
 
-            # Instructions
-            match = HamFile.re_instruction.match(line)
-            if match:
-                instruction_text = match.group(2)
-                if not instruction_text:
-                    instruction_text = ""
+        match = HamFile.re_processor.match(line)
+        if match:
+            name = match.group(1)
+            text = match.group(2)
+            processor_line = ProcessorLine(raw_line, name, text)
+            processor_line.original_line_number = line_number
+            current_scene.lines.append(processor_line)
+
+            if name.casefold() == "t":
+                (
+                    self.speech_time,
+                    self.speech_duration,
+                    self.speech_padding,
+                ) = _read_speech_time(text, line_number, self.ham.file_name)
+            return
 
-                instruction = InstructionLine(
-                    raw_line, match.group(1), instruction_text.strip()
-                )
-                instruction.original_line_number = line_number
-                instruction.time = current_speech_time
-
-                instruction_name = instruction.instruction()
-
-                if instruction_name == "SCENE":
-                    raise HamFileError(
-                        "'!SCENE foo' is not supported! use '== foo =='\n"
-                    )
-
-                elif instruction_name == "SPEECHTIME":
-                    try:
-                        val = instruction.text().split(":")[0]
-                        current_speech_time = float(val)
-                    except ValueError:
-                        raise HamFileError(
-                            "Expected float for SPEECHTIME, got '%s'"
-                            % instruction.text(),
-                            line_number,
-                            self.file_name,
-                        )
+        # Instructions
+        match = HamFile.re_instruction.match(line)
+        if match:
+            instruction_text = match.group(2)
+            if not instruction_text:
+                instruction_text = ""
 
-                current_scene.lines.append(instruction)
-                continue
+            instruction = InstructionLine(
+                raw_line, match.group(1), instruction_text.strip()
+            )
+            instruction.original_line_number = line_number
+            instruction.time = self.speech_time
 
-            # Continuation
-            match = HamFile.re_continuation.match(line)
-            if match:
-                try:
-                    last_line = current_scene.lines[-1]
-                except IndexError:
-                    raise HamFileError("No line to continue")
+            instruction_name = instruction.instruction()
 
-                last_line.text(last_line.text() + "\n" + match.group(1))
-                continue
+            if instruction_name == "SCENE":
+                raise HamFileError("'!SCENE foo' is not supported! use '== foo =='\n")
 
-            # Speaker Change
-            match = HamFile.re_speaker_change.match(line)
-            if match:
-                speaker_var = "VOICE_" + match.group(1).upper().replace(" ", "_")
-                current_speaker = self.get_variable(speaker_var)
-                if not current_speaker:
-                    current_speaker = match.group(1).lower()
+            elif instruction_name == "SPEECHTIME":
+                self.speech_time = _read_instruction_speech_time(
+                    instruction.text(), line_number, self.ham.file_name
+                )
 
-                line = match.group(2)
+            current_scene.lines.append(instruction)
+            return
 
-            add_line(raw_line, line)
+        # Continuation
+        match = HamFile.re_continuation.match(line)
+        if match:
+            try:
+                last_line = current_scene.lines[-1]
+            except IndexError:
+                raise HamFileError("No line to continue")
 
-        self.scenes.append(current_scene)
+            last_line.text(last_line.text() + "\n" + match.group(1))
+            return
 
-    def find_line_scene(self, line: "LineBase") -> "HamFileScene":
-        for scene in self.scenes:
-            for scene_line in scene.lines:
-                if line is scene_line:
-                    return scene
+        # Speaker Change
+        match = HamFile.re_speaker_change.match(line)
+        if match:
+            speaker_var = "VOICE_" + match.group(1).upper().replace(" ", "_")
+            speaker_line = self.find_variable_line(speaker_var)
+            self.speaker = speaker_line.value() if speaker_line else None
+            if not self.speaker:
+                self.speaker = match.group(1).lower()
+
+            line = match.group(2)
+
+        self._add_line(raw_line, line)
+
+    def finish(self):
+        self.on_scene(self.scene)
+
+
+class _LazyScene(HamFileScene):
+    """
+    A scene whose lines are parsed the first time they're used.
+    """
+
+    def __init__(
+        self,
+        ham: HamFile,
+        name: str,
+        index: int,
+        raw_lines: "list[str]",
+        line_number: int,
+        speech: tuple,
+    ):
+        # Not calling HamFileScene.__init__, that would set lines
+        self.name = name
+        self.variable_scenes: dict[str, _LazyScene] = {}
+        self._ham = ham
+        self._index = index
+        self._raw_lines = raw_lines
+        self._line_number = line_number
+        self._speech = speech
+        self._lines = None
+
+    @property
+    def lines(self) -> list:
+        if self._lines is None:
+            self._lines = self._parse()
+        return self._lines
+
+    @lines.setter
+    def lines(self, value: list):
+        self._lines = value
+        self._raw_lines = None
+
+    def _find_earlier_variable_line(self, name: str) -> VariableLine:
+        name = name.upper()
+        if name.startswith("_"):
+            return None
 
+        scene = self.variable_scenes.get(name)
+        if not scene or scene._index >= self._index:
+            return None
+
+        for line in scene.lines:
+            if line.kind == "variable" and line.name() == name:
+                return line
+
+    def _parse(self) -> list:
+        # Timing earlier in the file that couldn't be read
+        if isinstance(self._speech, Exception):
+            raise self._speech
+
+        reader = _SceneReader(
+            self._ham,
+            HamFileScene(),
+            self._find_earlier_variable_line,
+            lambda scene: None,
+            self._line_number,
+            self._speech,
+        )
+        for line in self._raw_lines:
+            reader.feed(line)
+
+        self._raw_lines = None
+        return reader.scene.lines
+
+
+def from_file(
+    file_or_name, name: str = "", lazy: bool = False, cache=None
+) -> "HamFile":
+    """
+    Read a HamFile from a file name, or an open file.
+
+    If lazy is set, each scene is only parsed once its lines are used. This is
+    cheaper for tools that only need a few scenes. Global constants are looked
+    up in the scene that defined them when the file was read, so filling a
+    scene's text only parses that scene and the ones its constants come from.
+
+    If a HamFileCache is given, the file is loaded through it, and the result
+    is a shared, frozen HamFile; lazy is ignored.
+    """
+    if cache is not None:
+        return cache.load(file_or_name, name)
 
-def from_file(file_or_name, name: str = "") -> "HamFile":
     if type(file_or_name) == str:
         name = file_or_name
 
         ham = HamFile(name)
         with open(name, "r") as file_or_name:
-            ham._read_scenes(file_or_name)
+            ham._read(file_or_name, lazy)
     else:
         if len(name) == 0:
             raise ValueError("name is required when reading an existing file")
 
         ham = HamFile(name)
-        ham._read_scenes(file_or_name)
+        ham._read(file_or_name, lazy)
 
     return ham
 
 
+def _read_speech_time(text: str, line_number: int, file_name: str) -> tuple:
+    text = text.casefold()
+    splits = text.split(":")
+    try:
+        time = float(splits[0])
+        return (time,) + tuple(float(t) for t in splits[1].split(","))
+    except ValueError:
+        raise HamFileError(
+            "Expected float for speech time, got '%s'" % text,
+            line_number,
+            file_name,
+        )
+
+
+def _read_instruction_speech_time(text: str, line_number: int, file_name: str):
+    try:
+        val = text.split(":")[0]
+        return float(val)
+    except ValueError:
+        raise HamFileError(
+            "Expected float for SPEECHTIME, got '%s'" % text,
+            line_number,
+            file_name,
+        )
+
+
+LineChange = namedtuple("LineChange", ["change", "scene", "old", "new"])
+
+
+def diff_lines(old: HamFile, new: HamFile) -> "list[LineChange]":
+    """
+    Report which lines differ between two HamFiles, by comparing fingerprints.
+
+    Scenes are matched by name, and for repeated names, by which occurrence
+    of the name they are. Each change is "added", "removed" or "changed";
+    a changed line is one that was replaced in place. old and new hold the
+    lines from either file, or None. Comments are ignored.
+    """
+
+    def fingerprinted(ham: HamFile, scene: HamFileScene):
+        if not scene:
+            return [], []
+        lines = scene.content_lines()
+        return lines, [line.fingerprint(ham, scene) for line in lines]
+
+    changes = []
+    old_scenes = _scenes_by_occurrence(old)
+    new_scenes = _scenes_by_occurrence(new)
+    keys = list(new_scenes)
+    keys += [key for key in old_scenes if key not in new_scenes]
+
+    for key in keys:
+        name = key[0]
+        old_scene = old_scenes.get(key)
+        new_scene = new_scenes.get(key)
+        old_lines, old_prints = fingerprinted(old, old_scene)
+        new_lines, new_prints = fingerprinted(new, new_scene)
+
+        matcher = difflib.SequenceMatcher(None, old_prints, new_prints, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                continue
+
+            paired = min(i2 - i1, j2 - j1) if tag == "replace" else 0
+            for k in range(paired):
+                changes.append(
+                    LineChange("changed", name, old_lines[i1 + k], new_lines[j1 + k])
+                )
+            for line in old_lines[i1 + paired : i2]:
+                changes.append(LineChange("removed", name, line, None))
+            for line in new_lines[j1 + paired : j2]:
+                changes.append(LineChange("added", name, None, line))
+
+    return changes
+
+
+def _scenes_by_occurrence(ham: HamFile) -> "dict[tuple[str, int], HamFileScene]":
+    # Keyed by name and how many scenes before it had the same name
+    scenes = {}
+    counts = {}
+    for scene in ham.scenes:
+        count = counts.get(scene.name, 0)
+        counts[scene.name] = count + 1
+        scenes[(scene.name, count)] = scene
+    return scenes
+
+
 def _read_string(text: str, start: int = 0) -> tuple[str, int]:
     if start >= len(text):
         raise ValueError()
@@ -0,0 +1,139 @@
+"""
+Rebuild HamFiles from the JSON made by HamFile.to_dict, without going back
+through Ham text.
+
+to_dict only keeps what downstream tools need, so the rebuilt file has no
+processor lines other than scene headers, and text is already resolved. Speech
+lines are the exception, and keep their $constants. Those are restored from the
+resolved global constants, and each scene's resolved _local ones, so speech
+fills in to the same text as in the original file.
+"""
+
+import json
+
+from ._ham_file import HamFile
+from ._scene import *
+
+
+def from_dict(obj: dict, name: str = "") -> HamFile:
+    builder = _Builder(name)
+    for variable in obj.get("variables", []):
+        builder.add_variable(variable)
+
+    for scene in obj.get("scenes", []):
+        builder.add_scene(scene["name"])
+        for variable in scene.get("variables", []):
+            builder.add_variable(variable)
+        for line in scene["lines"]:
+            builder.add_line(line)
+
+    return builder.ham
+
+
+def from_json(file_or_name, name: str = "") -> HamFile:
+    if type(file_or_name) == str:
+        with open(file_or_name, "r") as f:
+            return from_dict(json.load(f), name or file_or_name)
+
+    return from_dict(json.load(file_or_name), name)
+
+
+def from_ndjson(file_or_name, name: str = "") -> HamFile:
+    """
+    Read the records written by to_ndjson, one at a time.
+    """
+    if type(file_or_name) == str:
+        with open(file_or_name, "r") as f:
+            return from_ndjson(f, name or file_or_name)
+
+    builder = _Builder(name)
+    for line in file_or_name:
+        if not line.strip():
+            continue
+
+        record = json.loads(line)
+        kind = record.get("kind")
+        if kind == "variable":
+            builder.add_variable(record)
+        elif kind == "scene":
+            builder.add_scene(record["name"])
+        else:
+            builder.add_line(record)
+
+    return builder.ham
+
+
+def to_ndjson(ham: HamFile, file):
+    """
+    Write to_dict as one JSON record per line: global variables first, then
+    each scene header followed by its _local variables and its lines.
+    """
+    obj = ham.to_dict()
+
+    for variable in obj["variables"]:
+        file.write(json.dumps(dict(variable, kind="variable")) + "\n")
+
+    for scene in obj["scenes"]:
+        file.write(json.dumps({"kind": "scene", "name": scene["name"]}) + "\n")
+        for variable in scene.get("variables", []):
+            file.write(json.dumps(dict(variable, kind="variable")) + "\n")
+        for line in scene["lines"]:
+            file.write(json.dumps(line) + "\n")
+
+
+class _Builder:
+    def __init__(self, name: str):
+        self.ham = HamFile(name)
+        self.scene = self.ham.scenes[0]
+
+    def add_variable(self, obj: dict):
+        line = VariableLine("", obj["name"], _escape(obj["value"]))
+        if line.name().startswith("_"):
+            self.scene.lines.append(line)
+        else:
+            self.ham.scenes[0].lines.append(line)
+
+    def add_scene(self, name: str):
+        if name is None:
+            self.scene = self.ham.scenes[0]
+            return
+
+        self.scene = HamFileScene(name)
+        self.scene.lines.append(ProcessorLine("", "scene", name))
+        self.ham.scenes.append(self.scene)
+
+    def add_line(self, obj: dict):
+        kind = obj["kind"]
+
+        if kind == "text":
+            # TextLine.to_dict writes "[action] text"
+            text = obj["text"]
+            action = ""
+            match = HamFile.re_line_action.match(text)
+            if match:
+                text = text[match.end() :]
+                action = match.group(1)
+
+            line = TextLine("", obj["name"], text)
+            line.action(action)
+            line.duration = obj.get("duration", 0.0)
+            line.padding = obj.get("padding", 0.0)
+
+        elif kind == "instruction":
+            line = InstructionLine("", obj["name"], _escape(obj["text"]))
+
+        elif kind == "comment":
+            text = obj["text"] if obj["name"] == "#" else None
+            line = CommentLine("", text)
+
+        else:
+            raise ValueError(f"Unknown line kind: {kind}")
+
+        line.time = obj.get("time", 0.0)
+        line.original_line_number = obj.get("line_number", -1)
+        self.scene.lines.append(line)
+
+
+def _escape(text: str) -> str:
+    # Resolved text has no constants left, so any $ is literal
+    return text.replace("$", "\\$")
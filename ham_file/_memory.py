@@ -0,0 +1,92 @@
+import sys
+
+
+def memory_report(ham) -> dict:
+    """
+    Estimate where a HamFile's memory goes, in bytes.
+
+    Objects shared between lines, such as interned strings, cached templates
+    and the attributes of forked lines, are only counted once. Cached
+    templates, filled text and lookup dicts count as caches. Scenes that
+    haven't been parsed yet (see from_file's lazy option) are counted as
+    unparsed text, rather than being parsed to measure them.
+    """
+    seen = set()
+
+    def size(obj) -> int:
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        return sys.getsizeof(obj)
+
+    kinds = {}
+    report = {
+        "kinds": kinds,
+        "lines": 0,
+        "objects": 0,
+        "strings": 0,
+        "caches": 0,
+        "containers": size(ham) + size(ham.__dict__) + size(ham.scenes),
+        "unparsed": 0,
+    }
+
+    for scene in ham.scenes:
+        report["containers"] += size(scene) + size(scene.__dict__)
+
+        raw_lines = getattr(scene, "_raw_lines", None)
+        if raw_lines is not None:
+            report["unparsed"] += size(raw_lines) + sum(size(l) for l in raw_lines)
+            continue
+
+        lines = scene.lines
+        report["containers"] += size(lines)
+
+        for line in lines:
+            kind = kinds.setdefault(line.kind, {"lines": 0, "objects": 0, "strings": 0})
+            kind["lines"] += 1
+
+            objects = size(line) + size(line.__dict__)
+            strings = 0
+            for name, value in line.__dict__.items():
+                if name == "_template":
+                    if value is not None:
+                        report["caches"] += size(value) + sum(size(v) for v in value)
+                elif isinstance(value, str):
+                    strings += size(value)
+                else:
+                    objects += size(value)
+
+            kind["objects"] += objects
+            kind["strings"] += strings
+
+    # Lookup dicts and filled text kept by HamFile and FrozenHamFile. Lines and
+    # scenes in them are already counted above.
+    for name in [
+        "_filled",
+        "_values",
+        "_variable_scenes",
+        "_line_scenes",
+        "_global_lines",
+        "_local_lines",
+    ]:
+        cache = ham.__dict__.get(name)
+        if cache is None:
+            continue
+
+        report["caches"] += size(cache)
+        for key, value in cache.items():
+            report["caches"] += size(key) + size(value)
+            if isinstance(key, tuple):
+                report["caches"] += sum(size(k) for k in key)
+
+    for kind in kinds.values():
+        report["lines"] += kind["lines"]
+        report["objects"] += kind["objects"]
+        report["strings"] += kind["strings"]
+
+    report["total"] = sum(
+        report[key]
+        for key in ["objects", "strings", "caches", "containers", "unparsed"]
+    )
+    report["bytes_per_line"] = report["total"] / max(report["lines"], 1)
+    return report
@@ -1,5 +1,32 @@
+import copy
+import hashlib
+import functools
+
 import regex as re
 
+from .exceptions import HamRuntimeError
+
+# Bumped on every fork, see LineBase.__setattr__
+_forks = 0
+
+# Bumped on every edit, so HamFile knows its filled constants may be stale
+_edits = 0
+
+re_variable = re.compile(r"(?<!\\)(?:\$([_a-z]\w*))", flags=re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_template(text: str) -> "tuple[str, ...]":
+    """
+    Split text into literal text, and $variable references.
+
+    Even items are literal text, with \\$ already unescaped, and odd items are
+    the names of the variables between them, as written.
+    """
+    parts = re_variable.split(text)
+    parts[::2] = [literal.replace("\\$", "$") for literal in parts[::2]]
+    return tuple(parts)
+
 
 class HamFileScene:
     def __init__(self, name=None):
@@ -11,12 +38,25 @@ class HamFileScene:
             return "Blank Scene"
         return "Scene " + self.name
 
+    def fork(self) -> "HamFileScene":
+        """
+        Copy-on-write copy of this scene, which is left as it is. Each line in
+        the fork is a new object sharing the original's attributes, and a line's
+        attributes are only copied once it's edited in either scene.
+        """
+        global _forks
+        _forks += 1
+
+        scene = HamFileScene(self.name)
+        scene.lines = [line._fork() for line in self.lines]
+        return scene
+
     def variables(self):
         for line in self.lines:
             if type(line) is VariableLine:
                 yield line
 
-    def to_dict(self, ham, include_comments: True) -> dict:
+    def content_lines(self, include_comments: bool = False) -> "list[LineBase]":
         def is_included(line: LineBase):
             if line.exclude_from_json_lines():
                 return False
@@ -26,16 +66,53 @@ class HamFileScene:
             else:
                 return line.kind != "comment"
 
-        return {
+        return [l for l in self.lines if is_included(l)]
+
+    def fingerprint(self, ham) -> str:
+        """
+        Hash of the scene name, and the fingerprint of each of its lines.
+        Comments are ignored.
+        """
+        lines = self.content_lines()
+        return _hash([self.name] + [l.fingerprint(ham, self) for l in lines])
+
+    def to_dict(self, ham, include_comments: True, fingerprints: bool = False) -> dict:
+        lines = []
+        for line in self.content_lines(include_comments):
+            d = line.to_dict(ham, self)
+            if fingerprints:
+                d["fingerprint"] = line.fingerprint(ham, self)
+            lines.append(d)
+
+        d = {
             "name": self.name,
-            "lines": [l.to_dict(ham, self) for l in self.lines if is_included(l)],
+            "lines": lines,
         }
 
+        # Speech text keeps its $constants, so _local ones are needed to read it
+        local_variables = [
+            {"name": line.name(), "value": ham.fill_line(line, self)}
+            for line in self.variables()
+            if line.name().startswith("_")
+        ]
+        if local_variables:
+            d["variables"] = local_variables
+
+        if fingerprints:
+            d["fingerprint"] = _hash(
+                [self.name]
+                + [l["fingerprint"] for l in lines if l["kind"] != "comment"]
+            )
+        return d
+
 
 class LineBase:
     re_line_comment = re.compile(r"#(.*)$")
     time = 0.0
     original_line_number = -1
+    _template = None
+    _frozen = False
+    _forks = 0  # Value of _forks when the attributes were last copied
 
     def __init__(self, raw_line: str):
         self._line_comment = self._parse_line_comment(raw_line)
@@ -49,8 +126,74 @@ class LineBase:
 
         return raw
 
+    def template(self) -> "tuple[str, ...]":
+        """
+        This line's text, compiled by compile_template. Cached until the text
+        changes.
+        """
+        if self._template is None:
+            # Not an edit, so don't copy attributes shared with a fork
+            self.__dict__["_template"] = compile_template(str(self.text()))
+        return self._template
+
+    def variable_names(self) -> "frozenset[str]":
+        """
+        Names of the constants this line refers to, uppercase.
+        """
+        return frozenset(name.upper() for name in self.template()[1::2])
+
+    def _on_change(self):
+        # Called before the line is edited
+        global _edits
+        if self._frozen:
+            raise self._frozen_error()
+        self._template = None
+        _edits += 1
+
+    def _frozen_error(self) -> HamRuntimeError:
+        return HamRuntimeError(
+            "Can't edit a frozen line, fork() the HamFile first",
+            self.original_line_number,
+            "",
+        )
+
+    def __copy__(self) -> "LineBase":
+        # Copies are never frozen
+        line = object.__new__(type(self))
+        attributes = dict(self.__dict__)
+        attributes.pop("_frozen", None)
+        if _forks:
+            attributes["_forks"] = _forks
+        object.__setattr__(line, "__dict__", attributes)
+        return line
+
+    def _fork(self) -> "LineBase":
+        """
+        New line sharing this one's attributes, until either is edited.
+        """
+        if self._frozen:
+            return copy.copy(self)
+
+        line = object.__new__(type(self))
+        object.__setattr__(line, "__dict__", self.__dict__)
+        return line
+
+    def __setattr__(self, name: str, value):
+        # Setters, and direct writes like line.time = 1, both end up here. If
+        # there's been a fork since this line last copied its attributes, they
+        # may be shared, so copy them before writing.
+        if self._frozen:
+            raise self._frozen_error()
+
+        if self._forks != _forks:
+            attributes = dict(self.__dict__, _forks=_forks)
+            object.__setattr__(self, "__dict__", attributes)
+
+        object.__setattr__(self, name, value)
+
     def line_comment(self, value: str = None) -> str:
         if value:
+            self._on_change()
             self._line_comment = value.rstrip()
 
         return self._line_comment or ""
@@ -59,12 +202,28 @@ class LineBase:
         return {
             "kind": self.kind,
             "name": self.name(),
-            "text": ham.fill_variables(self.text(), scene, True),
+            "text": ham.fill_line(self, scene),
             # "text": self.text(),
             "time": self.time or 0.0,
             "line_number": self.original_line_number,
         }
 
+    def fingerprint(self, ham, scene) -> str:
+        """
+        Stable hash of what this line means to downstream tools: its kind, name,
+        timing and text after constants are filled in. Raw formatting and line
+        comments don't affect it.
+        """
+        return _hash(self._fingerprint_fields(ham, scene))
+
+    def _fingerprint_fields(self, ham, scene) -> list:
+        return [
+            self.kind,
+            self.name(),
+            ham.fill_line(self, scene),
+            self.time or 0.0,
+        ]
+
     def exclude_from_json_lines(self):
         return False
 
@@ -97,8 +256,8 @@ class CommentLine(LineBase):
 
     def text(self, value: str = None) -> str:
         if value:
-            self._text = value
             self._on_change()
+            self._text = value
         return self._text
 
     def _parse_line_comment(self, line: str) -> str:
@@ -121,11 +280,13 @@ class PrefixLine(LineBase):
 
     def name(self, value: str = None) -> str:
         if value:
+            self._on_change()
             self._name = value
         return self._name
 
     def text(self, value: str = None) -> str:
         if value:
+            self._on_change()
             self._text = value
         return self._text
 
@@ -175,6 +336,7 @@ class VariableLine(LineBase):
 
     def name(self, value: str = None) -> str:
         if value:
+            self._on_change()
             self._name = value
 
         return self._name
@@ -185,6 +347,7 @@ class VariableLine(LineBase):
     # TODO remove
     def value(self, new_value: str = None) -> str:
         if new_value:
+            self._on_change()
             self._value = new_value
 
         return self._value
@@ -219,6 +382,7 @@ class TextLine(LineBase):
     # TODO remove, just use self.name
     def speaker(self, value: str = None) -> str:
         if value:
+            self._on_change()
             self._speaker = value
         return self._speaker
 
@@ -228,6 +392,7 @@ class TextLine(LineBase):
     # TODO return full text, add methods for parsing speech/action
     def text(self, value: str = None) -> str:
         if value:
+            self._on_change()
             self._text = value
         return self._text
 
@@ -236,6 +401,7 @@ class TextLine(LineBase):
 
     def action(self, value: str = None) -> str:
         if value:
+            self._on_change()
             self._action = value
         return self._action
 
@@ -248,6 +414,19 @@ class TextLine(LineBase):
         d["padding"] = self.padding
         return d
 
+    def variable_names(self) -> "frozenset[str]":
+        names = compile_template(self._action)[1::2]
+        return super().variable_names() | {name.upper() for name in names}
+
+    def _fingerprint_fields(self, ham, scene) -> list:
+        fields = super()._fingerprint_fields(ham, scene)
+        fields += [
+            ham.fill_variables(self._action, scene, True),
+            self.duration,
+            self.padding,
+        ]
+        return fields
+
     def _raw(self):
         speaker = self._speaker.capitalize()
 
@@ -255,3 +434,8 @@ class TextLine(LineBase):
             return "%s: [%s] %s" % (speaker, self._action, self._text)
         else:
             return "%s: %s" % (speaker, self._text)
+
+
+def _hash(fields: list) -> str:
+    text = "\x1f".join(repr(field) for field in fields)
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
@@ -0,0 +1,158 @@
+"""
+Long-lived parse server, so short-lived tools don't each pay for startup and a
+full parse of the same script.
+
+The protocol is newline-delimited JSON over a Unix domain socket. Each request
+is one object, and is answered with one object:
+
+    {"op": "to_dict", "path": "show.ham"}
+    {"op": "scene", "path": "show.ham", "name": "Home"}
+    {"op": "variables", "path": "show.ham"}
+    {"op": "raw", "path": "show.ham"}
+
+    {"ok": true, "result": ...}
+    {"ok": false, "error": "..."}
+
+A connection may send any number of requests.
+"""
+
+import errno
+import json
+import os
+import socket
+import socketserver
+import stat
+
+from .exceptions import *
+from ._cache import HamFileCache
+
+
+class HamServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, cache: HamFileCache = None):
+        self.socket_path = socket_path
+        self.cache = cache if cache is not None else HamFileCache()
+
+        _remove_stale_socket(socket_path)
+        super().__init__(socket_path, _RequestHandler)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+    def handle_request_obj(self, request: dict):
+        if not isinstance(request, dict):
+            raise ValueError("request must be a JSON object")
+
+        op = request.get("op")
+        path = request.get("path")
+        if not path:
+            raise ValueError("path is required")
+        if not isinstance(path, str):
+            raise ValueError("path must be a string")
+
+        ham = self.cache.load(path)
+
+        if op == "to_dict":
+            return ham.to_dict()
+        elif op == "scene":
+            name = request.get("name", "")
+            if not isinstance(name, str):
+                raise ValueError("name must be a string")
+
+            scene = ham.get_scene_by_name(name)
+            if not scene:
+                return None
+            return scene.to_dict(ham, include_comments=False)
+        elif op == "variables":
+            return ham.resolved_variables()
+        elif op == "raw":
+            return str(ham)
+
+        raise ValueError(f"Unknown op: {op}")
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+
+            try:
+                request = json.loads(line)
+                response = {
+                    "ok": True,
+                    "result": self.server.handle_request_obj(request),
+                }
+            except (HamFileError, OSError, ValueError) as e:
+                response = {"ok": False, "error": str(e).strip()}
+            except Exception as e:
+                # Any file may be requested, so a bug it triggers must still be
+                # answered, rather than dropping the connection
+                response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+def _remove_stale_socket(socket_path: str):
+    """
+    Remove a socket left behind by a server that is no longer running.
+
+    Raises FileExistsError if the path is anything else, such as a Ham file
+    given by mistake, or the socket of a server that is still running.
+    """
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        return
+
+    if not stat.S_ISSOCK(mode):
+        raise FileExistsError(
+            errno.EEXIST, "Not a socket, refusing to replace it", socket_path
+        )
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except ConnectionRefusedError:
+            os.unlink(socket_path)
+            return
+
+    raise FileExistsError(
+        errno.EADDRINUSE, "A server is already listening", socket_path
+    )
+
+
+def serve(socket_path: str, max_bytes: int = None):
+    cache = HamFileCache(max_bytes) if max_bytes else HamFileCache()
+
+    with HamServer(socket_path, cache) as server:
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+def query(socket_path: str, op: str, path: str, **kwargs):
+    """
+    Send a single request to a running HamServer, and return its result.
+
+    Raises HamRuntimeError if the server reports an error.
+    """
+    request = dict(kwargs, op=op, path=path)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+
+        with sock.makefile("rb") as f:
+            response = json.loads(f.readline())
+
+    if not response["ok"]:
+        raise HamRuntimeError(response["error"], -1, path)
+    return response["result"]
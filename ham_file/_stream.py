@@ -0,0 +1,158 @@
+"""
+Write and read Ham files that keep growing, such as a script generated live,
+without rewriting or re-parsing the whole file each time.
+"""
+
+import os
+
+from ._ham_file import HamFile, _SceneReader
+from ._scene import *
+
+
+class HamAppender:
+    """
+    Writes a HamFile to file_name, then on each flush() only appends the lines
+    added since the last one.
+
+    Lines may be added to the last scene, and new scenes may be added after it.
+    Any other change (adding lines to an earlier scene, removing scenes) is
+    noticed, and the whole file is rewritten instead. Edits to lines that were
+    already written are not noticed; call rewrite() after making them.
+    """
+
+    def __init__(self, ham: HamFile, file_name: str):
+        self.ham = ham
+        self.file_name = file_name
+        self._flushed: "list[tuple[HamFileScene, int]]" = None
+
+    def flush(self) -> int:
+        """
+        Write new lines, and return how many were written.
+        """
+        if not self._can_append():
+            return self.rewrite()
+
+        lines = []
+        last = len(self._flushed) - 1
+        for i, scene in enumerate(self.ham.scenes[last:], start=last):
+            start = self._flushed[i][1] if i == last else 0
+            lines += scene.lines[start:]
+
+        if lines:
+            with open(self.file_name, "a") as f:
+                f.write("".join(str(line) + "\n" for line in lines))
+
+        self._mark_flushed()
+        return len(lines)
+
+    def rewrite(self) -> int:
+        # Replace the file, rather than truncating it, so HamTail can tell
+        temp_name = self.file_name + ".tmp"
+        with open(temp_name, "w") as f:
+            f.write(str(self.ham) + "\n")
+        os.replace(temp_name, self.file_name)
+
+        self._mark_flushed()
+        return sum(count for _, count in self._flushed)
+
+    def _can_append(self) -> bool:
+        if self._flushed is None or len(self.ham.scenes) < len(self._flushed):
+            return False
+
+        for i, (scene, count) in enumerate(self._flushed):
+            if self.ham.scenes[i] is not scene:
+                return False
+
+            # Only the last scene written may have grown
+            is_last = i == len(self._flushed) - 1
+            if len(scene.lines) < count or (not is_last and len(scene.lines) > count):
+                return False
+
+        return True
+
+    def _mark_flushed(self):
+        self._flushed = [(scene, len(scene.lines)) for scene in self.ham.scenes]
+
+
+class HamTail:
+    """
+    Follows a Ham file that is being appended to, like tail -f.
+
+    Each read() parses only the complete lines written since the last one, and
+    adds them to self.ham. A partly written last line is kept until its newline
+    arrives. If the file shrinks or is replaced, it is read again from the
+    start.
+
+    If a line can't be parsed, read() raises its error and skips that line.
+    The lines after it are parsed by the next read(), which also returns any
+    lines parsed before the error.
+    """
+
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self._reset()
+
+    def _reset(self):
+        self.ham = HamFile(self.file_name)
+        self._offset = 0
+        self._partial = b""
+        self._inode = None
+        # Scene index and line count already returned by read()
+        self._returned = (0, 0)
+        self._reader = _SceneReader(
+            self.ham,
+            self.ham.scenes[0],
+            self._find_earlier_variable_line,
+            lambda scene: None,
+        )
+
+    def read(self) -> "list[LineBase]":
+        """
+        Parse new lines, and return them. Continuation lines extend an earlier
+        line, so they aren't returned themselves.
+        """
+        with open(self.file_name, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size < self._offset or (
+                self._inode is not None and stat.st_ino != self._inode
+            ):
+                self._reset()
+            self._inode = stat.st_ino
+
+            f.seek(self._offset)
+            data = f.read()
+        self._offset += len(data)
+
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        self._partial = data[end:]
+
+        scenes = self.ham.scenes
+        lines = data[:end].split(b"\n")[:-1]
+        for i, line in enumerate(lines):
+            try:
+                self._reader.feed(line.decode("utf-8") + "\n")
+            except Exception:
+                # Skip the bad line, and keep the rest for the next read()
+                rest = b"".join(line + b"\n" for line in lines[i + 1 :])
+                self._partial = rest + self._partial
+                raise
+
+            if self._reader.scene is not scenes[-1]:
+                scenes.append(self._reader.scene)
+
+        first_scene, first_line = self._returned
+        new_lines = list(scenes[first_scene].lines[first_line:])
+        for scene in scenes[first_scene + 1 :]:
+            new_lines += scene.lines
+
+        self._returned = (len(scenes) - 1, len(scenes[-1].lines))
+        return new_lines
+
+    def _find_earlier_variable_line(self, name: str) -> VariableLine:
+        # Like from_file, ignore the scene that's still being read
+        current = self.ham.scenes.pop()
+        try:
+            return self.ham.find_variable_line(name)
+        finally:
+            self.ham.scenes.append(current)